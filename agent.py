@@ -7,17 +7,16 @@ from typing import TypedDict, Annotated
 from agent_tools import find_relevant_diffs
 from dotenv import load_dotenv
 from contextlib import ExitStack
+from functools import lru_cache
 import operator
 import uuid
 
 load_dotenv()
 
 index_name = "rootly"
-model = ChatCohere(model='command-r')
-search_tool = TavilySearchResults(max_results=2) 
+agent_state_db = "agent_state.db"
 
 stack = ExitStack()
-memory = stack.enter_context(SqliteSaver.from_conn_string(":memory:"))
 
 agent_prompt = '''
 You are a professional software engineer that can read code and understand the changes made in a PR.
@@ -37,6 +36,7 @@ class AgentState(TypedDict):
 class Agent:
     def __init__(self, model, tools, checkpointer, system=""):
         self.system = system
+        self.system_messages = [SystemMessage(content=system)] if system else []
         graph = StateGraph(AgentState)
         graph.add_node("llm", self.call_llm)
         graph.add_node("action", self.take_action)
@@ -56,9 +56,7 @@ class Agent:
         return len(result.tool_calls) > 0
 
     def call_llm(self, state: AgentState):
-        messages = state['messages']
-        if self.system:
-            messages = [SystemMessage(content=self.system)] + messages
+        messages = self.system_messages + state['messages']
         message = self.model.invoke(messages)
         return {'messages': [message]}
 
@@ -77,17 +75,36 @@ class Agent:
         return {'messages': results}
     
 
-messages = [HumanMessage(content="Broken pinecone upsert")]
-user_uuid = str(uuid.uuid4())
-print(user_uuid)
+@lru_cache(maxsize=1)
+def get_agent() -> Agent:
+    '''
+    builds the agent once per process and returns the same compiled graph and checkpointer on every call
+    '''
+    model = ChatCohere(model='command-r')
+    search_tool = TavilySearchResults(max_results=2)
+    memory = stack.enter_context(SqliteSaver.from_conn_string(agent_state_db))
 
-agent = Agent(model, tools=[find_relevant_diffs, search_tool], system=agent_prompt, checkpointer=memory)
-thread = {"configurable": {"thread_id": user_uuid}}
+    ## the saver already switches to wal, relax syncing to match and mmap so checkpoint reads skip read syscalls
+    memory.conn.executescript("""
+        PRAGMA synchronous=NORMAL;
+        PRAGMA mmap_size=268435456;
+        PRAGMA temp_store=MEMORY;
+    """)
+    return Agent(model, tools=[find_relevant_diffs, search_tool], system=agent_prompt, checkpointer=memory)
 
-output = []
 
-for event in agent.graph.stream({"messages": messages}, thread):
-    for v in event.values():
-        output.append(v)
+if __name__ == '__main__':
+    messages = [HumanMessage(content="Broken pinecone upsert")]
+    user_uuid = str(uuid.uuid4())
+    print(user_uuid)
 
-print(output[-1]['messages'][-1].content)
\ No newline at end of file
+    agent = get_agent()
+    thread = {"configurable": {"thread_id": user_uuid}}
+
+    output = []
+
+    for event in agent.graph.stream({"messages": messages}, thread):
+        for v in event.values():
+            output.append(v)
+
+    print(output[-1]['messages'][-1].content)
\ No newline at end of file
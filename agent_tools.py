@@ -7,6 +7,15 @@ import os
 
 load_dotenv()
 retriever = Retriever()
+chat = ChatCohere(model='command-r-plus')
+system_message = SystemMessage(content='''
+        You are a professional software engineer that can read code and understand the changes made in a PR.
+        You will be given a list of PRs and their diffs, and an issue description.
+        Your job is to find the PR that is most relevant to the issue description.
+        You will output the PR id and url of the most relevant PR with a description of the changes made in the PR.
+        Do not suggest any fixes, just the PR id and the description of the changes found within.
+        For the description of changes, denote which lines each significant change is on.
+        ''')
 
 @tool('find_relevant_diffs')
 def find_relevant_diffs(issue_description: str) -> str:
@@ -18,25 +27,18 @@ def find_relevant_diffs(issue_description: str) -> str:
 
     search_results = retriever.semantic_search(issue_description, index_name='rootly', top_k=5)
     for result in search_results['matches']:
-        prs.append({"id": result['id'], "url": result['metadata']['url']})
+        prs.append({"id": result['id'], "url": result['metadata']['url'], "head_sha": result['metadata'].get('head_sha')})
 
     ## grab the diffs for the IDs found from semantic search
     pr_ids = [pr['id'] for pr in prs]
-    diffs = retriever.get_diffs(owner='ethanbailie', repo='agentic_code_observer', pr_ids=pr_ids)
+    head_shas = {pr['id']: pr['head_sha'] for pr in prs}
+    diffs = retriever.get_diffs(owner='ethanbailie', repo='agentic_code_observer', pr_ids=pr_ids, head_shas=head_shas)
 
     ## make a dictionary with the PR id as the key and the url and diff as the value
     diffs_with_metadata = {pr['id']: {"url": pr['url'], "diff": diffs[pr['id']]} for pr in prs}
 
-    chat = ChatCohere(model='command-r-plus')
     messages = [
-        SystemMessage(content='''
-        You are a professional software engineer that can read code and understand the changes made in a PR.
-        You will be given a list of PRs and their diffs, and an issue description.
-        Your job is to find the PR that is most relevant to the issue description.
-        You will output the PR id and url of the most relevant PR with a description of the changes made in the PR.
-        Do not suggest any fixes, just the PR id and the description of the changes found within.
-        For the description of changes, denote which lines each significant change is on.
-        '''),
+        system_message,
         HumanMessage(content=f'''
         Here are the PRs most likely to have caused the issue, in the form of a dictionary with the PR id as the key and the diff as the value:
         {diffs_with_metadata}
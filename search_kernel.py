@@ -0,0 +1,42 @@
+import numpy as np
+from numba import njit, prange
+
+@njit(parallel=True, fastmath={'reassoc', 'contract'}, cache=True)
+def top_k_recent(matrix, query, updated_at, cutoff, k, n_chunks):
+    '''
+    fused dot product, recency filter and top k over the rows of a matrix, returns (positions, scores) best first
+    matrix: np.ndarray - (n, d) float32 unit vectors
+    query: np.ndarray - (d,) float32 unit query vector
+    updated_at: np.ndarray - (n,) updated_at timestamp of each row
+    cutoff: float - rows updated before this are skipped
+    k: int - the number of results to return
+    n_chunks: int - the number of chunks scanned in parallel
+    '''
+    n, d = matrix.shape
+    chunk_size = (n + n_chunks - 1) // n_chunks
+    best_scores = np.full((n_chunks, k), -np.inf, dtype=np.float32)
+    best_positions = np.full((n_chunks, k), -1, dtype=np.int64)
+
+    ## each chunk keeps its own top k sorted best first, so threads never share state
+    for c in prange(n_chunks):
+        for i in range(c * chunk_size, min((c + 1) * chunk_size, n)):
+            if updated_at[i] < cutoff:
+                continue
+            score = np.float32(0.0)
+            for j in range(d):
+                score += matrix[i, j] * query[j]
+            if score <= best_scores[c, k - 1]:
+                continue
+            pos = k - 1
+            while pos > 0 and best_scores[c, pos - 1] < score:
+                best_scores[c, pos] = best_scores[c, pos - 1]
+                best_positions[c, pos] = best_positions[c, pos - 1]
+                pos -= 1
+            best_scores[c, pos] = score
+            best_positions[c, pos] = i
+
+    ## merge the per chunk results
+    scores = best_scores.ravel()
+    positions = best_positions.ravel()
+    order = np.argsort(-scores)[:k]
+    return positions[order], scores[order]
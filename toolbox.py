@@ -1,18 +1,223 @@
-import requests
+import httpx
+import itertools
+import operator
+import json
+import orjson
+import faiss
+import diskcache
+import time
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from langchain_openai import OpenAIEmbeddings
 from pinecone import Pinecone, ServerlessSpec
 import os
 
+## max number of texts cohere accepts per embed request
+EMBED_BATCH_SIZE = 96
+
+## text embedded for each pr, filled from the fields picked by EMBED_TEXT_FIELDS
+EMBED_TEXT_TEMPLATE = 'Title: %s. Description: %s. Merge Description: %s.'
+EMBED_TEXT_FIELDS = operator.itemgetter('title', 'description', 'merge_description')
+
+## query cache params for the retriever
+QUERY_CACHE_SIZE = 1024
+RESULT_CACHE_SIZE = 256
+RESULT_CACHE_TTL = 300
+RESULT_CACHE_SIMILARITY = 0.95
+
+## on-disk faiss mirror of the pinecone index, searched instead of pinecone while it stays small
+LOCAL_INDEX_DIR = '.vector_cache'
+LOCAL_INDEX_MAX_VECTORS = 10_000
+
+## max bytes of a pr diff to download, larger diffs are truncated
+MAX_DIFF_BYTES = 32 * 1024
+
+## on-disk cache of pr diffs, keyed by pr id and head sha since a diff never changes for a given head
+DIFF_CACHE_DIR = '.diff_cache'
+DIFF_CACHE_TTL = 24 * 60 * 60
+
+## sqlite store of etags and bodies for conditional github requests, and of commit messages by sha
+ETAG_CACHE_PATH = '.etag_cache.db'
+
+def github_client(github_token: str, max_connections: int) -> httpx.Client:
+    '''
+    builds a keep-alive http/2 client authenticated against github
+    github_token: str - the github token to authenticate with
+    max_connections: int - the max number of pooled connections
+    '''
+    return httpx.Client(
+        http2=True,
+        headers={
+            'Authorization': f'Bearer {github_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        },
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=30.0,
+        follow_redirects=True
+    )
+
+class ETagCache():
+    '''
+    sqlite backed store of response etags and bodies keyed by url, plus commit messages keyed by sha, shared across threads
+    '''
+    def __init__(self, path=ETAG_CACHE_PATH):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS etags (url TEXT PRIMARY KEY, etag TEXT NOT NULL, body BLOB NOT NULL)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS commit_messages (sha TEXT PRIMARY KEY, message TEXT NOT NULL)')
+            self.conn.commit()
+
+    def get(self, url: str):
+        '''
+        returns the (etag, body) stored for a url, or None if there isn't one
+        url: str - the url of the request
+        '''
+        with self.lock:
+            return self.conn.execute('SELECT etag, body FROM etags WHERE url = ?', (url,)).fetchone()
+
+    def set(self, url: str, etag: str, body: bytes):
+        '''
+        stores the etag and body returned for a url
+        url: str - the url of the request
+        etag: str - the etag header of the response
+        body: bytes - the body of the response
+        '''
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO etags (url, etag, body) VALUES (?, ?, ?)', (url, etag, body))
+            self.conn.commit()
+
+    def get_commit_message(self, sha: str):
+        '''
+        returns the message stored for a commit, or None if there isn't one
+        sha: str - the sha of the commit
+        '''
+        with self.lock:
+            row = self.conn.execute('SELECT message FROM commit_messages WHERE sha = ?', (sha,)).fetchone()
+        return row[0] if row else None
+
+    def set_commit_message(self, sha: str, message: str):
+        '''
+        stores the message of a commit, commits are immutable so it never needs refreshing
+        sha: str - the sha of the commit
+        message: str - the commit message
+        '''
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO commit_messages (sha, message) VALUES (?, ?)', (sha, message))
+            self.conn.commit()
+
+def cached_get(http: httpx.Client, etag_cache: ETagCache, url: str, params: dict = None) -> bytes:
+    '''
+    makes a conditional get and returns the body, reusing the stored body when github answers 304 not modified
+    raises httpx.HTTPStatusError for any other non 200 response
+    http: httpx.Client - the client to make the request with
+    etag_cache: ETagCache - the store of etags and bodies
+    url: str - the url to get
+    params: dict - optional query params, part of the cache key
+    '''
+    url = str(httpx.URL(url, params=params))
+    cached = etag_cache.get(url)
+    headers = {'If-None-Match': cached[0]} if cached else {}
+
+    response = http.get(url, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[1]
+    response.raise_for_status()
+
+    etag = response.headers.get('ETag')
+    if response.status_code == 200 and etag:
+        etag_cache.set(url, etag, response.content)
+    return response.content
+
+def local_index_paths(index_name: str) -> tuple:
+    '''
+    returns the faiss index path and metadata path of the local mirror of an index
+    index_name: str - the name of the pinecone index
+    '''
+    return (
+        os.path.join(LOCAL_INDEX_DIR, f'{index_name}.faiss'),
+        os.path.join(LOCAL_INDEX_DIR, f'{index_name}.json')
+    )
+
 class Embedder():
     '''
     embeds pr data from github and upserts to pinecone
     '''
-    def __init__(self, model='embed-english-v3.0'):
+    def __init__(self, model='embed-english-v3.0', batch_size=100, pool_threads=30):
         self.embeddings = CohereEmbeddings(model=model)
+        self.batch_size = batch_size
+        self.pool_threads = pool_threads
         self.pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
         self.github_token = os.getenv('GITHUB_TOKEN')
 
+        ## shared http/2 client so concurrent commit fetches reuse pooled connections
+        self.http = github_client(self.github_token, max_connections=16)
+        self.etag_cache = ETagCache()
+
+    def __del__(self):
+        ## release the pooled github connections
+        if hasattr(self, 'http'):
+            self.http.close()
+        if hasattr(self, 'etag_cache'):
+            self.etag_cache.conn.close()
+
+    def _fetch_commit_message(self, owner: str, repo: str, sha: str) -> str:
+        '''
+        fetches a single commit and returns its message, skipping the request if the message is already stored
+        owner: str - the owner of the repo
+        repo: str - the repo name
+        sha: str - the sha of the commit
+        '''
+        message = self.etag_cache.get_commit_message(sha)
+        if message is not None:
+            return message
+
+        commit_url = f'https://api.github.com/repos/{owner}/{repo}/commits/{sha}'
+        response = self.http.get(commit_url)
+        if response.status_code != 200:
+            print(f"Error: {response.status_code} fetching commit {sha}.")
+            return ''
+
+        message = orjson.loads(response.content).get('commit', {}).get('message', '')
+        self.etag_cache.set_commit_message(sha, message)
+        return message
+
+    def _fetch_commit_messages_since(self, owner: str, repo: str, since: str) -> dict:
+        '''
+        lists all commits since a given time and returns a dict mapping commit sha to message
+        owner: str - the owner of the repo
+        repo: str - the repo name
+        since: str - iso 8601 timestamp to list commits from
+        '''
+        commit_messages = {}
+        commits_url = f'https://api.github.com/repos/{owner}/{repo}/commits'
+        params = {
+            'since': since,
+            'per_page': 100
+        }
+        page = 1
+
+        while True:
+            params['page'] = page
+            response = self.http.get(commits_url, params=params)
+            if response.status_code != 200:
+                print(f"Error: {response.status_code} listing commits. Merge descriptions will fall back to one request per commit.")
+                break
+
+            commits = orjson.loads(response.content)
+            commit_messages.update({commit['sha']: commit['commit']['message'] for commit in commits})
+
+            ## a short page means we've reached the end of the listing
+            if len(commits) < params['per_page']:
+                break
+            page += 1
+
+        return commit_messages
+
     ## function to fetch all PRs
     def fetch_recent_prs(self, owner: str, repo: str, hours_ago: int) -> list:
         '''
@@ -26,63 +231,77 @@ class Embedder():
         ## pagination params
         params = {
             'state': 'all',
+            'sort': 'updated',
+            'direction': 'desc',
             'per_page': 100
         }
         page = 1
 
         ## build the pr url
         pr_url = f'https://api.github.com/repos/{owner}/{repo}/pulls'
-        headers = {
-            'Authorization': f'Bearer {self.github_token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
 
         ## calculate the timestamp for 24 hours ago
         recency = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
-        recency_str = recency.isoformat() + 'Z'
+        recency_str = recency.strftime('%Y-%m-%dT%H:%M:%SZ')
 
         while True:
             params['page'] = page
-            response = requests.get(pr_url, headers=headers, params=params)
 
-            if response.status_code != 200:
-                print(f"Error: {response.status_code}. Ensure you have access to the repo with the provided credentials.")
+            ## page urls are stable between runs, so unchanged pages come back as a 304 with no body
+            try:
+                prs = orjson.loads(cached_get(self.http, self.etag_cache, pr_url, params=params))
+            except httpx.HTTPStatusError as e:
+                print(f"Error: {e.response.status_code}. Ensure you have access to the repo with the provided credentials.")
                 return []
 
-            prs = response.json()
+            ## prs come back most recently updated first, so stop at the first one outside the window
+            reached_cutoff = False
+            for pr in prs:
+                if pr['updated_at'] < recency_str:
+                    reached_cutoff = True
+                    break
+                all_recent_prs.append(pr)
 
-            ## filter on the recency param
-            recent_prs = [pr for pr in prs if pr['updated_at'] >= recency_str]
-
-            ## break if no more recent PRs are found
-            if not recent_prs:
+            if reached_cutoff or len(prs) < params['per_page']:
                 break
-
-            all_recent_prs.extend(recent_prs)
             page += 1
 
         ## put all details into a list of dicts
         all_prs = []
+        merge_commit_shas = []
 
         for pr in all_recent_prs:
             if pr.get('merged_at'):
                 pr_details = {
                     'id': pr['id'],
+                    'number': pr['number'],
                     'title': pr['title'],
                     'state': pr['state'],
                     'description': pr['body'],
-                    'updated_at': datetime.strptime(pr['updated_at'], '%Y-%m-%dT%H:%M:%SZ').timestamp(),
-                    'url': pr['html_url']
+                    'updated_at': datetime.fromisoformat(pr['updated_at'].rstrip('Z')).replace(tzinfo=timezone.utc).timestamp(),
+                    'url': pr['html_url'],
+                    'head_sha': pr['head']['sha']
                 }
+                all_prs.append(pr_details)
+                merge_commit_shas.append(pr['merge_commit_sha'])
 
-                ## fetch and display merge description if the PR was merged
-                merge_commit_sha = pr['merge_commit_sha']
-                commit_url = f'https://api.github.com/repos/{owner}/{repo}/commits/{merge_commit_sha}'
-                commit_response = requests.get(commit_url, headers=headers).json()
-                merge_description = commit_response.get('commit', {}).get('message', '')
-                pr_details['merge_description'] = merge_description
+        if not all_prs:
+            return all_prs
+
+        ## look merge descriptions up in a single listing of recent commits
+        commit_messages = self._fetch_commit_messages_since(owner, repo, recency_str)
+
+        ## fall back to fetching individual commits concurrently for any not in the listing
+        ## (e.g. PRs merged before the window but updated within it)
+        missing_shas = [sha for sha in merge_commit_shas if sha not in commit_messages]
+        if missing_shas:
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                missing_messages = executor.map(lambda sha: self._fetch_commit_message(owner, repo, sha), missing_shas)
+                commit_messages.update(zip(missing_shas, missing_messages))
+
+        for pr_details, merge_commit_sha in zip(all_prs, merge_commit_shas):
+            pr_details['merge_description'] = commit_messages.get(merge_commit_sha, '')
 
-                all_prs.append(pr_details)
         return all_prs
 
     def embed_pr_data(self, pr_data_list: list) -> list:
@@ -91,25 +310,28 @@ class Embedder():
         pr_data_list: list - a list of dicts containing pr data
         '''
         ids = []
-        texts = []
         metadatas = []
         if not pr_data_list:
             return []
 
+        texts = [EMBED_TEXT_TEMPLATE % EMBED_TEXT_FIELDS(pr) for pr in pr_data_list]
+
         for pr in pr_data_list:
-            pr_id = pr['url'].split('/')[-1]
-            text_to_embed = f"Title: {pr['title']}. Description: {pr['description']}. Merge Description: {pr['merge_description']}."
+            pr_id = str(pr['number'])
             metadata = {
                 'title': pr['title'],
                 'state': pr['state'],
                 'updated_at': pr['updated_at'],
-                'url': pr['url']
+                'url': pr['url'],
+                'head_sha': pr['head_sha']
             }
             ids.append(pr_id)
-            texts.append(text_to_embed)
             metadatas.append(metadata)
 
-        embeddings_list = self.embeddings.embed_documents(texts)
+        ## embed in provider sized batches concurrently, map keeps the results in order
+        batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            embeddings_list = [vector for batch in executor.map(self.embeddings.embed_documents, batches) for vector in batch]
 
         vectors = []
         for pr_id, vector, metadata in zip(ids, embeddings_list, metadatas):
@@ -138,8 +360,51 @@ class Embedder():
                 )
             )
 
-        index = self.pc.Index(index_name)
-        index.upsert(vectors)
+        ## upsert in batches in parallel and wait for all of them to land, closing the thread pool after
+        vectors_iter = iter(vectors)
+        batches = iter(lambda: list(itertools.islice(vectors_iter, self.batch_size)), [])
+        with self.pc.Index(index_name, pool_threads=self.pool_threads) as index:
+            async_results = [index.upsert(vectors=batch, async_req=True) for batch in batches]
+            for async_result in async_results:
+                async_result.get()
+
+        self.upsert_to_local(vectors, index_name)
+
+    def upsert_to_local(self, vectors: list, index_name: str):
+        '''
+        upserts the vectors to the on-disk faiss mirror of the pinecone index
+        vectors: list - a list of tuples containing the pr id, vector, and metadata
+        index_name: str - the name of the index being mirrored
+        '''
+        if not vectors:
+            return
+
+        ## load what's already mirrored, keyed by pr id so upserts replace old entries
+        index_path, metadata_path = local_index_paths(index_name)
+        entries = {}
+        if os.path.exists(index_path) and os.path.exists(metadata_path):
+            local_index = faiss.read_index(index_path)
+            with open(metadata_path) as f:
+                stored = json.load(f)
+            entries = dict(zip(stored['ids'], zip(local_index.reconstruct_n(0, local_index.ntotal), stored['metadatas'])))
+
+        ## vectors are l2 normalized so inner product is cosine similarity, matching pinecone
+        for pr_id, vector, metadata in vectors:
+            vector = np.asarray(vector, dtype='float32')
+            entries[pr_id] = (vector / np.linalg.norm(vector), metadata)
+
+        matrix = np.stack([vector for vector, _ in entries.values()])
+        local_index = faiss.IndexFlatIP(matrix.shape[1])
+        local_index.add(matrix)
+
+        ## write to temp paths and swap them in so a retriever never reads a half written file,
+        ## the index goes first since retrievers reload when the metadata changes
+        os.makedirs(LOCAL_INDEX_DIR, exist_ok=True)
+        faiss.write_index(local_index, f'{index_path}.tmp')
+        os.replace(f'{index_path}.tmp', index_path)
+        with open(f'{metadata_path}.tmp', 'w') as f:
+            json.dump({'ids': list(entries), 'metadatas': [metadata for _, metadata in entries.values()]}, f)
+        os.replace(f'{metadata_path}.tmp', metadata_path)
 
 class Retriever():
     '''
@@ -150,38 +415,240 @@ class Retriever():
         self.pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
         self.github_token = os.getenv('GITHUB_TOKEN')
 
+        ## shared http/2 client so concurrent diff fetches reuse pooled connections
+        self.http = github_client(self.github_token, max_connections=20)
+
+        ## exact text -> embedding lru, and recent unit query vectors -> search results
+        self._embedding_cache = OrderedDict()
+        self._result_cache = []
+
+        ## local faiss mirrors by index name, loaded from disk on first use
+        self._local_indices = {}
+
+        self.diff_cache = diskcache.Cache(DIFF_CACHE_DIR)
+
+    def __del__(self):
+        ## release the pooled github connections
+        if hasattr(self, 'http'):
+            self.http.close()
+
+    def _embed_query(self, issue_description: str) -> list:
+        '''
+        embeds the issue description, reusing the embedding if the exact same text was seen before
+        issue_description: str - the description of the issue
+        '''
+        if issue_description in self._embedding_cache:
+            self._embedding_cache.move_to_end(issue_description)
+            return self._embedding_cache[issue_description]
+
+        query_embedding = self.embeddings.embed_query(issue_description)
+        self._embedding_cache[issue_description] = query_embedding
+        if len(self._embedding_cache) > QUERY_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
+        return query_embedding
+
+    def _cached_results(self, query_vector: np.ndarray, index_name: str, top_k: int):
+        '''
+        returns the search results of a recent near-duplicate query, or None if there isn't one
+        query_vector: np.ndarray - the l2 normalized query embedding
+        index_name: str - the name of the index being searched
+        top_k: int - the number of results requested
+        '''
+        ## drop stale entries so results don't outlive the recency window by much
+        now = time.monotonic()
+        self._result_cache = [entry for entry in self._result_cache if now - entry['stamp'] < RESULT_CACHE_TTL]
+
+        candidates = [entry for entry in self._result_cache if entry['index_name'] == index_name and entry['top_k'] == top_k]
+        if not candidates:
+            return None
+
+        similarities = np.stack([entry['vector'] for entry in candidates]) @ query_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= RESULT_CACHE_SIMILARITY:
+            return candidates[best]['results']
+        return None
+
+    def _load_local_index(self, index_name: str):
+        '''
+        returns the local faiss mirror of an index, or None if there isn't one or it's mid update
+        index_name: str - the name of the pinecone index
+        '''
+        index_path, metadata_path = local_index_paths(index_name)
+        if not (os.path.exists(index_path) and os.path.exists(metadata_path)):
+            return None
+
+        ## reload when the embedder has rewritten the mirror since we last read it
+        mtime = os.path.getmtime(metadata_path)
+        local = self._local_indices.get(index_name)
+        if local is None or local['mtime'] != mtime:
+            with open(metadata_path) as f:
+                stored = json.load(f)
+            local_index = faiss.read_index(index_path)
+
+            ## the two files are swapped in one after the other, so skip a pair that doesn't line up yet
+            if len(stored['ids']) != local_index.ntotal:
+                return None
+
+            local = {
+                'mtime': mtime,
+                'index': local_index,
+                'ids': stored['ids'],
+                'metadatas': stored['metadatas'],
+                'matrix': None
+            }
+            self._local_indices[index_name] = local
+
+        return local
+
+    def _local_search(self, local: dict, query_vector: np.ndarray, cutoff_time: float, top_k: int) -> dict:
+        '''
+        performs an exact search on a local faiss mirror and returns results shaped like a pinecone query response
+        local: dict - the local mirror returned by _load_local_index
+        query_vector: np.ndarray - the l2 normalized query embedding
+        cutoff_time: float - the earliest updated_at timestamp to return
+        top_k: int - the number of results to return
+        '''
+        ## the mirror is small, so rank everything and apply the recency filter client side
+        scores, positions = local['index'].search(query_vector[np.newaxis, :], local['index'].ntotal)
+
+        matches = []
+        for score, position in zip(scores[0], positions[0]):
+            metadata = local['metadatas'][position]
+            if metadata['updated_at'] < cutoff_time:
+                continue
+            matches.append({'id': local['ids'][position], 'score': float(score), 'metadata': metadata})
+            if len(matches) == top_k:
+                break
+
+        return {'matches': matches}
+
+    def _brute_force_search(self, local: dict, query_vector: np.ndarray, cutoff_time: float, top_k: int) -> dict:
+        '''
+        scans every vector of a local mirror with the numba kernel and returns results shaped like a pinecone query response
+        local: dict - the local mirror returned by _load_local_index
+        query_vector: np.ndarray - the l2 normalized query embedding
+        cutoff_time: float - the earliest updated_at timestamp to return
+        top_k: int - the number of results to return
+        '''
+        ## copy the unit vectors out of faiss once per load, along with the timestamps to filter on
+        if local['matrix'] is None:
+            local['matrix'] = local['index'].reconstruct_n(0, local['index'].ntotal)
+            local['updated_at'] = np.array([metadata['updated_at'] for metadata in local['metadatas']])
+
+        ## only reached for mirrors too large for faiss search, so numba is loaded here rather than at import
+        from numba import get_num_threads
+        from search_kernel import top_k_recent
+        top, top_scores = top_k_recent(local['matrix'], query_vector, local['updated_at'], cutoff_time, top_k, get_num_threads())
+
+        ## filtered out rows score -inf and are dropped
+        matches = [
+            {'id': local['ids'][position], 'score': float(score), 'metadata': local['metadatas'][position]}
+            for position, score in zip(top, top_scores) if np.isfinite(score)
+        ]
+        return {'matches': matches}
+
     def semantic_search(self, issue_description: str, index_name: str, top_k: int = 5) -> list:
         '''
-        performs a semantic search on the pinecone index for PRs that may have caused an issue and returns the top 3 most likely PRs
+        performs a semantic search on the pinecone index (or its local mirror) for PRs that may have caused an issue and returns the top 3 most likely PRs
         issue_description: str - the description of the issue
         index_name: str - the name of the index to search on
         top_k: int - the number of results to return
         '''
         cutoff_time = (datetime.now(timezone.utc) - timedelta(hours=12)).timestamp()
-        query_embedding = self.embeddings.embed_query(issue_description)
-        index = self.pc.Index(index_name)
-        results = index.query(vector=query_embedding, top_k=top_k, include_metadata=True, filter={'updated_at': {'$gte': cutoff_time}})
+        query_embedding = self._embed_query(issue_description)
+
+        ## reuse results for near-duplicate issues (retries, repeated alerts)
+        query_vector = np.asarray(query_embedding, dtype='float32')
+        query_vector /= np.linalg.norm(query_vector)
+        results = self._cached_results(query_vector, index_name, top_k)
+        if results is not None:
+            return results
+
+        ## search the local mirror when there is one, skipping the round trip to pinecone
+        local = self._load_local_index(index_name)
+        if local is not None and local['index'].ntotal <= LOCAL_INDEX_MAX_VECTORS:
+            results = self._local_search(local, query_vector, cutoff_time, top_k)
+        else:
+            try:
+                index = self.pc.Index(index_name)
+                results = index.query(vector=query_embedding, top_k=top_k, include_metadata=True, filter={'updated_at': {'$gte': cutoff_time}})
+            except Exception as e:
+                ## pinecone is unreachable, so scan the local mirror if we have one
+                if local is None:
+                    raise
+                print(f"Error: pinecone query failed ({e}). Falling back to the local index.")
+                results = self._brute_force_search(local, query_vector, cutoff_time, top_k)
+
+        self._result_cache.append({
+            'vector': query_vector,
+            'index_name': index_name,
+            'top_k': top_k,
+            'results': results,
+            'stamp': time.monotonic()
+        })
+        if len(self._result_cache) > RESULT_CACHE_SIZE:
+            self._result_cache.pop(0)
 
         return results
 
-    def get_diffs(self, owner: str, repo: str, pr_ids: list) -> list:
+    def _fetch_diff(self, diff_url: str) -> tuple:
+        '''
+        streams a pr diff and returns (status code, diff), the diff is truncated with a marker once it exceeds MAX_DIFF_BYTES
+        and is None if github didn't return it
+        diff_url: str - the url of the diff
+        '''
+        data = bytearray()
+        with self.http.stream('GET', diff_url) as response:
+            if response.status_code != 200:
+                print(f"Error: {response.status_code} fetching {diff_url}.")
+                return response.status_code, None
+            for chunk in response.iter_bytes():
+                data += chunk
+                if len(data) > MAX_DIFF_BYTES:
+                    break
+
+        ## the cut may land mid character, so drop any partial trailing bytes
+        diff = data[:MAX_DIFF_BYTES].decode('utf-8', errors='ignore')
+        if len(data) > MAX_DIFF_BYTES:
+            diff += f'\n... [diff truncated at {MAX_DIFF_BYTES} bytes]'
+        return response.status_code, diff
+
+    def get_diffs(self, owner: str, repo: str, pr_ids: list, head_shas: dict = None) -> list:
         '''
         gets the diffs for the prs and returns a list of dicts containing the pr id and diff
         owner: str - the owner of the repo
         repo: str - the repo name
         pr_ids: list - a list of pr ids
+        head_shas: dict - optional mapping of pr id to head sha, diffs are only cached for prs with a known head sha
+        diffs that couldn't be fetched are replaced with an unavailable marker and are never cached
         '''
         if not pr_ids:
             return []
 
+        ## serve what we can from the disk cache
+        head_shas = head_shas or {}
+        cache_keys = {pr_id: (owner, repo, pr_id, head_shas[pr_id]) for pr_id in pr_ids if head_shas.get(pr_id)}
         diffs = {}
+        for pr_id, cache_key in cache_keys.items():
+            diff = self.diff_cache.get(cache_key)
+            if diff is not None:
+                diffs[pr_id] = diff
 
-        for pr_id in pr_ids:
-            pr_url = f'https://github.com/{owner}/{repo}/pull/{pr_id}.diff'
-            headers = {
-                'Authorization': f'Bearer {self.github_token}',
-                'Accept': 'application/vnd.github.v3+json'
-            }
-            diff_response = requests.get(pr_url, headers=headers).text
-            diffs[pr_id] = diff_response
-        return diffs
+        ## fire the remaining diff requests concurrently, latency is bound by the slowest one
+        missing_ids = [pr_id for pr_id in pr_ids if pr_id not in diffs]
+        if missing_ids:
+            pr_urls = [f'https://github.com/{owner}/{repo}/pull/{pr_id}.diff' for pr_id in missing_ids]
+            with ThreadPoolExecutor(max_workers=min(len(pr_urls), 20)) as executor:
+                diff_responses = executor.map(self._fetch_diff, pr_urls)
+
+            for pr_id, (status_code, diff) in zip(missing_ids, diff_responses):
+                ## tell the llm the fetch failed rather than passing it an empty diff
+                if diff is None:
+                    diffs[pr_id] = f'[diff unavailable: HTTP {status_code}]'
+                    continue
+
+                diffs[pr_id] = diff
+                if pr_id in cache_keys:
+                    self.diff_cache.set(cache_keys[pr_id], diff, expire=DIFF_CACHE_TTL)
+
+        return {pr_id: diffs[pr_id] for pr_id in pr_ids}